@@ -24,6 +24,7 @@ from transformers.feature_extraction_utils import (
 from .dataset import ForecastDFDataset
 from .util import (
     FractionLocation,
+    get_group_positions,
     get_split_params,
     join_list_without_repeat,
     select_by_fixed_fraction,
@@ -692,9 +693,17 @@ class TimeSeriesPreprocessor(FeatureExtractionMixin):
 
         # split data
         if isinstance(split_function, dict):
-            train_data = split_function["train"](data, id_columns=self.id_columns, **split_params["train"])
-            valid_data = split_function["valid"](data, id_columns=self.id_columns, **split_params["valid"])
-            test_data = split_function["test"](data, id_columns=self.id_columns, **split_params["test"])
+            # share a single groupby pass between the three selections
+            group_positions = get_group_positions(data, self.id_columns) if self.id_columns else None
+            train_data = split_function["train"](
+                data, id_columns=self.id_columns, group_positions=group_positions, **split_params["train"]
+            )
+            valid_data = split_function["valid"](
+                data, id_columns=self.id_columns, group_positions=group_positions, **split_params["valid"]
+            )
+            test_data = split_function["test"](
+                data, id_columns=self.id_columns, group_positions=group_positions, **split_params["test"]
+            )
         else:
             train_data, valid_data, test_data = split_function(data, id_columns=self.id_columns, **split_params)
 
@@ -2,12 +2,13 @@
 #
 """Basic functions and utilities"""
 
-import copy
 import enum
+import warnings
 from datetime import datetime
 from distutils.util import strtobool
 from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
+import numpy as np
 import pandas as pd
 
 
@@ -45,6 +46,17 @@ def select_by_timestamp(
     if not start_timestamp and not end_timestamp:
         raise ValueError("At least one of start_timestamp or end_timestamp must be specified.")
 
+    timestamps = df[timestamp_column]
+    if pd.api.types.is_datetime64_any_dtype(timestamps) and timestamps.is_monotonic_increasing:
+        # Sorted timestamps: locate the range endpoints with a binary search instead of a full boolean scan
+        tz = timestamps.dt.tz
+        start = _column_timestamp(start_timestamp, tz) if start_timestamp else None
+        end = _column_timestamp(end_timestamp, tz) if end_timestamp else None
+        if (start is not None or not start_timestamp) and (end is not None or not end_timestamp):
+            start = timestamps.searchsorted(start, side="left") if start_timestamp else 0
+            end = timestamps.searchsorted(end, side="left") if end_timestamp else len(df)
+            return df.iloc[start:end]
+
     if not start_timestamp:
         return df[df[timestamp_column] < end_timestamp]
 
@@ -54,11 +66,25 @@ def select_by_timestamp(
     return df[(df[timestamp_column] >= start_timestamp) & (df[timestamp_column] < end_timestamp)]
 
 
+def _column_timestamp(value: Union[str, datetime], tz: Optional[Any]) -> Optional[pd.Timestamp]:
+    """Helper function converting a bound to a Timestamp in the timezone of the timestamp column.
+    Returns None when the comparison does not follow pandas' own rules (naive datetime objects against an
+    aware column, aware bounds against a naive column), so that the caller falls back to the mask comparison."""
+    bound = pd.Timestamp(value)
+    if tz is None:
+        return bound if bound.tzinfo is None else None
+    if bound.tzinfo is None:
+        # pandas interprets naive strings in the column's timezone
+        return bound.tz_localize(tz) if isinstance(value, str) else None
+    return bound.tz_convert(tz)
+
+
 def select_by_index(
     df: pd.DataFrame,
     id_columns: Optional[List[str]] = None,
     start_index: Optional[int] = None,
     end_index: Optional[int] = None,
+    group_positions: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None,
 ) -> pd.DataFrame:
     """Select a portion of a dataset based on integer indices into the data.
     Note that the range selected is inclusive of the starting index. When ID columns are specified
@@ -71,6 +97,8 @@ def select_by_index(
             Defaults to None. Use None to specify the start of the data.
         end_index (Optional[Union[str, datetime]], optional): Index of the ending point.
             Use None to specify the end of the data. Defaults to None.
+        group_positions (Tuple[np.ndarray, np.ndarray, np.ndarray], optional): Output of `get_group_positions`
+            for `df` and `id_columns`, to share one groupby pass across several selections. Defaults to None.
 
     Raises:
         ValueError: User must specify either start_index or end_index.
@@ -84,12 +112,9 @@ def select_by_index(
     if not id_columns:
         return _split_group_by_index(df, start_index=start_index, end_index=end_index).copy()
 
-    groups = df.groupby(_get_groupby_columns(id_columns))
-    result = []
-    for name, group in groups:
-        result.append(_split_group_by_index(group, name=name, start_index=start_index, end_index=end_index))
-
-    return pd.concat(result)
+    group_id, position, length = group_positions or get_group_positions(df, id_columns)
+    start, end = _index_bounds(length, group_id, df, id_columns, start_index=start_index, end_index=end_index)
+    return _take_groups(df, group_id, (position >= start) & (position < end))
 
 
 def select_by_relative_fraction(
@@ -98,6 +123,7 @@ def select_by_relative_fraction(
     start_fraction: Optional[float] = None,
     start_offset: Optional[int] = 0,
     end_fraction: Optional[float] = None,
+    group_positions: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None,
 ) -> pd.DataFrame:
     """Select a portion of a dataset based on relative fractions of the data.
     Note that the range selected is inclusive of the starting index. When ID columns are specified
@@ -115,6 +141,8 @@ def select_by_relative_fraction(
             each subseries. A non-negative value should be used. Defaults to 0.
         end_fraction (Optional[float], optional): The fraction to specify the end of the selection.
             Use None to specify the end of the dataset. Defaults to None.
+        group_positions (Tuple[np.ndarray, np.ndarray, np.ndarray], optional): Output of `get_group_positions`
+            for `df` and `id_columns`, to share one groupby pass across several selections. Defaults to None.
 
     Raises:
         ValueError: Raised when the user does not specify either start_index or end_index. Also raised
@@ -137,20 +165,25 @@ def select_by_relative_fraction(
             start_offset=start_offset,
         ).copy()
 
-    groups = df.groupby(_get_groupby_columns(id_columns))
-    result = []
-    for name, group in groups:
-        result.append(
-            _split_group_by_fraction(
-                group,
-                name=name,
-                start_fraction=start_fraction,
-                end_fraction=end_fraction,
-                start_offset=start_offset,
-            )
-        )
+    group_id, position, length = group_positions or get_group_positions(df, id_columns)
 
-    return pd.concat(result)
+    if start_fraction is not None:
+        start_index = (length * start_fraction).astype(int) - start_offset
+        negative = (start_index < 0) & (group_id >= 0)
+        if negative.any():
+            name = _first_group_name(df, id_columns, group_id, negative)
+            if name:
+                msg = f"Computed starting_index for id={name} is negative, please check individual time series lengths, start_fraction, and start_offset."
+            else:
+                msg = "Computed starting_index is negative, please check time series length, start_fraction, and start_offset."
+            raise ValueError(msg)
+    else:
+        start_index = None
+
+    end_index = (length * end_fraction).astype(int) if end_fraction is not None else None
+
+    start, end = _index_bounds(length, group_id, df, id_columns, start_index=start_index, end_index=end_index)
+    return _take_groups(df, group_id, (position >= start) & (position < end))
 
 
 def select_by_fixed_fraction(
@@ -159,6 +192,7 @@ def select_by_fixed_fraction(
     fraction: float = 1.0,
     location: str = FractionLocation.FIRST.value,
     minimum_size: Optional[int] = 0,
+    group_positions: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None,
 ) -> pd.DataFrame:
     """Select a portion of a dataset based on a fraction of the data.
     Fraction can either be located at the start (location = FractionLocation.FIRST) or at the end (location = FractionLocation.LAST)
@@ -169,6 +203,8 @@ def select_by_fixed_fraction(
         fraction (float): The fraction to select.
         location (str): Location of where to select the fraction Defaults to FractionLocation.FIRST.value.
         minimum_size (int, optional): Minimum size of the split. Defaults to None.
+        group_positions (Tuple[np.ndarray, np.ndarray, np.ndarray], optional): Output of `get_group_positions`
+            for `df` and `id_columns`, to share one groupby pass across several selections. Defaults to None.
 
     Raises:
         ValueError: Raised when the fraction is not within the range [0,1].
@@ -185,20 +221,22 @@ def select_by_fixed_fraction(
             df, fraction=fraction, location=location, minimum_size=minimum_size
         ).copy()
 
-    groups = df.groupby(_get_groupby_columns(id_columns))
-    result = []
-    for name, group in groups:
-        result.append(
-            _split_group_by_fixed_fraction(
-                group,
-                name=name,
-                fraction=fraction,
-                location=location,
-                minimum_size=minimum_size,
-            )
+    group_id, position, length = group_positions or get_group_positions(df, id_columns)
+    fraction_size = (fraction * (length - minimum_size)).astype(int) + minimum_size
+
+    if location == FractionLocation.FIRST.value:
+        start_index = np.zeros_like(length)
+        end_index = fraction_size
+    elif location == FractionLocation.LAST.value:
+        start_index = length - fraction_size
+        end_index = length
+    else:
+        raise ValueError(
+            f"`location` should be either `{FractionLocation.FIRST.value}` or `{FractionLocation.LAST.value}`"
         )
 
-    return pd.concat(result)
+    start, end = _index_bounds(length, group_id, df, id_columns, start_index=start_index, end_index=end_index)
+    return _take_groups(df, group_id, (position >= start) & (position < end))
 
 
 def train_test_split(
@@ -207,6 +245,7 @@ def train_test_split(
     train: Union[int, float] = 0.7,
     test: Union[int, float] = 0.2,
     valid_test_offset: int = 0,
+    group_positions: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None,
 ):
     # to do: add validation
 
@@ -218,21 +257,25 @@ def train_test_split(
             ]
         )
 
-    groups = df.groupby(_get_groupby_columns(id_columns))
-    result = []
-    for name, group in groups:
-        result.append(
-            _split_group_train_test(
-                group,
-                name=name,
-                train=train,
-                test=test,
-                valid_test_offset=valid_test_offset,
-            )
-        )
+    # One groupby pass gives every row's position and series length; the three splits are then boundary arrays
+    group_id, position, length = group_positions or get_group_positions(df, id_columns)
+
+    train_size = (length * train).astype(int)
+    test_size = (length * test).astype(int)
+    valid_size = length - train_size - test_size
+
+    bounds = {
+        "train": (np.zeros_like(length), train_size),
+        "valid": (train_size - valid_test_offset, train_size + valid_size),
+        "test": (train_size + valid_size - valid_test_offset, None),
+    }
+    _check_start_index(df, id_columns, group_id, length, *[start for start, _ in bounds.values()])
 
-    result_train, result_valid, result_test = zip(*result)
-    return pd.concat(result_train), pd.concat(result_valid), pd.concat(result_test)
+    result = []
+    for start_index, end_index in bounds.values():
+        start, end = _index_bounds(length, group_id, df, id_columns, start_index=start_index, end_index=end_index)
+        result.append(_take_groups(df, group_id, (position >= start) & (position < end)))
+    return tuple(result)
 
 
 def _split_group_train_test(
@@ -273,6 +316,87 @@ def _get_groupby_columns(id_columns: List[str]) -> Union[List[str], str]:
     return id_columns
 
 
+def get_group_positions(df: pd.DataFrame, id_columns: List[str]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Compute, in a single groupby pass, each row's group number, position within its group and group length.
+    The result can be passed as `group_positions` to the selection and split functions for the same dataframe.
+    Rows whose ID is missing (and which groupby therefore drops) get a group number of -1.
+
+    Args:
+        df (pd.DataFrame): Input dataframe.
+        id_columns (List[str]): Columns which specify the IDs in the dataset.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: Group numbers, positions within each group, and group lengths.
+    """
+    groups = df.groupby(_get_groupby_columns(id_columns))
+    group_id = groups.ngroup().fillna(-1).to_numpy(dtype=np.int64)
+    position = groups.cumcount().to_numpy()
+    # Count rows per group number rather than using groups.size(), which also lists unobserved categories
+    # of categorical ID columns and then no longer lines up with ngroup()
+    observed = group_id >= 0
+    length = np.where(observed, np.bincount(group_id[observed], minlength=group_id.max(initial=-1) + 1)[group_id], 0)
+    return group_id, position, length
+
+
+def _first_group_name(df: pd.DataFrame, id_columns: List[str], group_id: np.ndarray, rows: np.ndarray) -> Any:
+    """Helper function returning the ID of the first group (in groupby order) among the selected rows."""
+    selected = np.flatnonzero(rows)
+    row = selected[np.argmin(group_id[selected])]
+    key = [df[col].iloc[row : row + 1].tolist()[0] for col in id_columns]
+    return key[0] if len(id_columns) == 1 else tuple(key)
+
+
+def _index_bounds(
+    length: np.ndarray,
+    group_id: np.ndarray,
+    df: pd.DataFrame,
+    id_columns: List[str],
+    start_index: Optional[Union[int, np.ndarray]] = None,
+    end_index: Optional[Union[int, np.ndarray]] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Helper function computing per-row [start, end) positions equivalent to applying
+    `_split_group_by_index` to every group."""
+    start = np.zeros_like(length) if start_index is None else np.broadcast_to(start_index, length.shape)
+    end = length if end_index is None else np.broadcast_to(end_index, length.shape)
+
+    _check_start_index(df, id_columns, group_id, length, start)
+
+    # A falsy end_index is ignored once a non-zero start_index is given
+    end = np.where((start != 0) & (end == 0), length, end)
+
+    # Python slice semantics for negative / out of range indices
+    start = np.where(start < 0, np.maximum(start + length, 0), np.minimum(start, length))
+    end = np.where(end < 0, np.maximum(end + length, 0), np.minimum(end, length))
+    return start, end
+
+
+def _check_start_index(
+    df: pd.DataFrame,
+    id_columns: List[str],
+    group_id: np.ndarray,
+    length: np.ndarray,
+    *start_indices: np.ndarray,
+):
+    """Helper function raising the `_split_group_by_index` error for the first group any start index would empty."""
+    empty = np.zeros(len(group_id), dtype=bool)
+    for start_index in start_indices:
+        empty |= (start_index != 0) & (start_index >= length)
+    empty &= group_id >= 0
+
+    if empty.any():
+        name = _first_group_name(df, id_columns, group_id, empty)
+        msg = "Selection would result in an empty time series, please check start_index and time series length"
+        msg = msg + f" (id = {name})" if name else msg
+        raise ValueError(msg)
+
+
+def _take_groups(df: pd.DataFrame, group_id: np.ndarray, mask: np.ndarray) -> pd.DataFrame:
+    """Helper function selecting the masked rows, ordered group by group as in groupby iteration."""
+    rows = np.flatnonzero(mask & (group_id >= 0))
+    rows = rows[np.argsort(group_id[rows], kind="stable")]
+    return df.iloc[rows]
+
+
 def _split_group_by_index(
     group_df: pd.DataFrame,
     name: Optional[str] = None,
@@ -420,27 +544,43 @@ def convert_tsf_to_dataframe(
                             raise Exception("Missing attributes/values in series.")
 
                         series = full_info[len(full_info) - 1]
-                        series = series.split(",")
 
-                        if len(series) == 0:
+                        # Parse the whole series in C; "?" marks missing values. On a malformed token numpy 1.x
+                        # only warns and returns the values parsed so far (numpy 2.x raises), so make both fail here.
+                        try:
+                            with warnings.catch_warnings():
+                                warnings.simplefilter("error", DeprecationWarning)
+                                numeric_series = np.fromstring(series.replace("?", "nan"), sep=",", dtype=np.float64)
+                        except (DeprecationWarning, ValueError):
+                            numeric_series = None
+
+                        if (
+                            numeric_series is None
+                            or len(numeric_series) == 0
+                            or len(numeric_series) != series.count(",") + 1
+                        ):
                             raise Exception(
                                 "A given series should contains a set of comma separated numeric values. At least one numeric value should be there in a series. Missing values should be indicated with ? symbol"
                             )
 
-                        numeric_series = []
-
-                        for val in series:
-                            if val == "?":
-                                numeric_series.append(replace_missing_vals_with)
-                            else:
-                                numeric_series.append(float(val))
+                        # Missing values are the "?" tokens only; a literal "nan" in the file is a value
+                        if "?" in series:
+                            missing = np.array([val == "?" for val in series.split(",")])
+                            if missing.all():
+                                raise Exception(
+                                    "All series values are missing. A given series should contains a set of comma separated numeric values. At least one numeric value should be there in a series."
+                                )
 
-                        if numeric_series.count(replace_missing_vals_with) == len(numeric_series):
-                            raise Exception(
-                                "All series values are missing. A given series should contains a set of comma separated numeric values. At least one numeric value should be there in a series."
-                            )
+                            try:
+                                numeric_series[missing] = (
+                                    np.nan if replace_missing_vals_with is None else float(replace_missing_vals_with)
+                                )
+                            except (TypeError, ValueError):
+                                # Non-numeric replacement: keep it as is, in an object array
+                                numeric_series = numeric_series.astype(object)
+                                numeric_series[missing] = replace_missing_vals_with
 
-                        all_series.append(pd.Series(numeric_series).array)
+                        all_series.append(numeric_series)
 
                         for i in range(len(col_names)):
                             att_val = None
@@ -553,20 +693,18 @@ def convert_tsf(filename: str) -> pd.DataFrame:
         contain_equal_length,
     ) = convert_tsf_to_dataframe(filename)
 
-    dfs = []
-    for index, item in loaded_data.iterrows():
-        # todo: use actual dates for timestamp
-        dfs.append(
-            pd.DataFrame(
-                {
-                    "id": item.series_name,
-                    "timestamp": range(len(item.series_value)),
-                    "value": item.series_value,
-                }
-            )
-        )
-
-    df = pd.concat(dfs)
+    lengths = [len(series) for series in loaded_data.series_value]
+    # todo: use actual dates for timestamp
+    timestamps = np.concatenate([np.arange(length) for length in lengths])
+
+    df = pd.DataFrame(
+        {
+            "id": np.repeat(loaded_data.series_name.values, lengths),
+            "timestamp": timestamps,
+            "value": np.concatenate(loaded_data.series_value.values),
+        },
+        index=timestamps,
+    )
     return df
 
 
@@ -577,12 +715,11 @@ def join_list_without_repeat(*lists: List[List[Any]]) -> List[Any]:
         List[Any]: Combined list.
     """
 
-    final = None
-    final_set = set()
+    final = []
+    seen = set()
     for alist in lists:
-        if final is None:
-            final = copy.copy(alist)
-        else:
-            final = final + [item for item in alist if item not in final_set]
-        final_set = set(final)
+        for item in alist:
+            if item not in seen:
+                seen.add(item)
+                final.append(item)
     return final
@@ -1,46 +1,121 @@
+import json
+import os
 import pandas as pd
 import numpy as np
 import torch
+from numpy.lib.stride_tricks import sliding_window_view
 
-def preprocessing(data):
-    scheduled_matching = data[data["Date/Time"].dt.time == pd.to_datetime("14:46:00").time()]
-    train_size = len(scheduled_matching)*0.8
+# Getting price from 9:15-> 11:29 and 13:00->14:29 = 223 rows
+WINDOW_SIZE = 223
+TRAIN_RATIO = 0.8
+SCHEDULED_TIME = pd.to_datetime("14:46:00").time()
+DTYPE = np.float32
+CACHE_NAMES = ['x_train', 'y_train', 'x_test', 'y_test']
+# Bump when the sample layout changes in a way the parameters above don't capture, so old caches are rebuilt
+CACHE_VERSION = 1
+
+def _cache_paths(cache_dir):
+    return [os.path.join(cache_dir, f'{name}.npy') for name in CACHE_NAMES]
+
+def _fingerprint_path(cache_dir):
+    return os.path.join(cache_dir, 'fingerprint.json')
+
+def _fingerprint(data):
+    # Row hashes are summed, so the fingerprint ignores row order just like the sorted preprocessing does
+    return {
+        # How the arrays are built
+        'version': CACHE_VERSION,
+        'window_size': WINDOW_SIZE,
+        'train_ratio': TRAIN_RATIO,
+        'scheduled_time': SCHEDULED_TIME.isoformat(),
+        'dtype': np.dtype(DTYPE).name,
+        # What they are built from
+        'shape': list(data.shape),
+        'columns': [str(col) for col in data.columns],
+        'hash': int(pd.util.hash_pandas_object(data, index=False).to_numpy().sum()),
+    }
+
+def _load_cache(cache_dir, fingerprint, source_path=None):
+    paths = _cache_paths(cache_dir)
+    if not all(os.path.exists(path) for path in paths + [_fingerprint_path(cache_dir)]):
+        return None
+    # Arrays built from a different DataFrame (other ticker, rows or scaling) are not reused
+    with open(_fingerprint_path(cache_dir)) as f:
+        if json.load(f) != fingerprint:
+            return None
+    # Stale once the source CSV is newer than any cached array
+    if source_path is not None and os.path.getmtime(source_path) > min(os.path.getmtime(path) for path in paths):
+        return None
+    return tuple(np.load(path, mmap_mode='r') for path in paths)
+
+def _save_cache(cache_dir, arrays, fingerprint):
+    os.makedirs(cache_dir, exist_ok=True)
+    for path, array in zip(_cache_paths(cache_dir), arrays):
+        np.save(path, array)
+    # Written last, so an interrupted save is never mistaken for a valid cache
+    with open(_fingerprint_path(cache_dir), 'w') as f:
+        json.dump(fingerprint, f)
+
+def _build_windows(feats, ts, schedule_pos):
+    # Rows strictly before each scheduled close: searchsorted replaces the per-day `data[data['Date/Time'] < close_day]` scan
+    close_idx = np.searchsorted(ts, ts[schedule_pos[2:]], side='left')
+
+    # Every sample is written straight into one preallocated array: 223 previous rows, then the last two closes
+    out = np.empty((len(close_idx), WINDOW_SIZE + 2, feats.shape[1]), dtype=feats.dtype)
+    if len(close_idx) == 0:
+        # Fewer than three scheduled matchings: no samples, and the frame may be shorter than one window
+        return out
+    if len(feats) < WINDOW_SIZE or close_idx.min() < WINDOW_SIZE:
+        raise ValueError(f"Each scheduled matching needs at least {WINDOW_SIZE} previous rows.")
+
+    windows = sliding_window_view(feats, (WINDOW_SIZE, feats.shape[1]))
+    out[:, :WINDOW_SIZE] = windows[close_idx - WINDOW_SIZE, 0]
+    out[:, WINDOW_SIZE] = feats[schedule_pos[1:-1]]
+    out[:, WINDOW_SIZE + 1] = feats[schedule_pos[:-2]]
+    return out
+
+def preprocessing(data, cache_dir=None, source_path=None):
+    # With cache_dir set, arrays from a previous run are memory-mapped instead of rebuilt
+    if cache_dir is not None:
+        fingerprint = _fingerprint(data)
+        cached = _load_cache(cache_dir, fingerprint, source_path)
+        if cached is not None:
+            return cached
+
+    # Sort positions rather than the DataFrame (and skip it for already sorted data), then fill one preallocated
+    # float32 feature matrix column by column, so no intermediate copies of the whole frame are made
+    if data['Date/Time'].is_monotonic_increasing:
+        order = slice(None)
+    else:
+        order = np.argsort(data['Date/Time'].to_numpy(), kind='stable')
+    ts = data['Date/Time'].to_numpy()[order]
+    feature_cols = [col for col in data.columns if col != 'Date/Time']
+    feats = np.empty((len(data), len(feature_cols)), dtype=DTYPE)
+    for j, col in enumerate(feature_cols):
+        feats[:, j] = data[col].to_numpy()[order]
+    close = feats[:, feature_cols.index('Close')]
+
+    # Compare time-of-day fields directly: `.dt.time` would build an object array of datetime.time values
+    times = data["Date/Time"].dt
+    scheduled = (
+        (times.hour == SCHEDULED_TIME.hour)
+        & (times.minute == SCHEDULED_TIME.minute)
+        & (times.second == SCHEDULED_TIME.second)
+        & (times.microsecond == SCHEDULED_TIME.microsecond)
+    )
+    scheduled_pos = np.flatnonzero(scheduled.to_numpy()[order])
+    train_size = len(scheduled_pos)*TRAIN_RATIO
     train_row = int(train_size)
-    training_data_schedule = scheduled_matching.iloc[:train_row]
-    testing_data_schedule = scheduled_matching.iloc[train_row:]
-    #timeline = testing_data_schedule['Date\Time'].values
-    x_train = []
-    y_train = []
-    x_test = []
-    y_test = []
-
-    for i in range(2, len(training_data_schedule)):
-        close_day = training_data_schedule.iloc[[i]]['Date/Time'].values[0]
-        last_day  = data[data['Date/Time'] < close_day]
-        # Getting price from 9:15-> 11:29 and 13:00->14:29 = 223 rows
-        last_day_223_m = last_day.iloc[len(last_day)-223: ]
-        close_price_last_1day = training_data_schedule.iloc[[i-1]]
-        close_price_last_2day = training_data_schedule.iloc[[i-2]]
-        close_price_combined = pd.concat([last_day_223_m, close_price_last_1day, close_price_last_2day], axis=0).drop(['Date/Time'], axis=1).to_numpy()
-        x_train.append(close_price_combined)
-        y_train.append(training_data_schedule.iloc[[i]]['Close'].values[0])
-
-    for i in range(2, len(testing_data_schedule)):
-        close_day = testing_data_schedule.iloc[[i]]['Date/Time'].values[0]
-        last_day  = data[data['Date/Time'] < close_day]
-        # Getting price from 9:15-> 11:29 and 13:00->14:29 = 223 rows
-        last_day_223_m = last_day.iloc[len(last_day)-223: ]
-        close_price_last_1day = testing_data_schedule.iloc[[i-1]]
-        close_price_last_2day = testing_data_schedule.iloc[[i-2]]
-        close_price_combined = pd.concat([last_day_223_m, close_price_last_1day, close_price_last_2day], axis=0).drop(['Date/Time'], axis=1).to_numpy()
-        x_test.append(close_price_combined)
-        y_test.append(testing_data_schedule.iloc[[i]]['Close'].values[0])
-
-    # Reshaping the arrays into 3D arrays
-    x_train = np.array(x_train)
-    x_test = np.array(x_test)
-    y_train = np.array(y_train)
-    y_test = np.array(y_test)
+
+    # Sample k is built from scheduled matchings k, k+1 and k+2. The two samples at train_row-2 and train_row-1
+    # would mix training and testing days, so they belong to neither split.
+    x_all = _build_windows(feats, ts, scheduled_pos)
+    y_all = close[scheduled_pos[2:]]
+    x_train, y_train = x_all[:max(train_row - 2, 0)], y_all[:max(train_row - 2, 0)]
+    x_test, y_test = x_all[train_row:], y_all[train_row:]
+
+    if cache_dir is not None:
+        _save_cache(cache_dir, (x_train, y_train, x_test, y_test), fingerprint)
 
     #return torch.tensor(x_train, dtype=torch.float32), torch.tensor(y_train, dtype=torch.float32), torch.tensor(x_test, dtype=torch.float32), torch.tensor(y_test, dtype=torch.float32)
-    return x_train, y_train, x_test, y_test
\ No newline at end of file
+    return x_train, y_train, x_test, y_test
@@ -1,14 +1,25 @@
+import numpy as np
 import torch
-from torch.utils.data import Dataset, DataLoader
+from torch.utils.data import BatchSampler, DataLoader, RandomSampler, SequentialSampler, TensorDataset
 
-class Dataset(Dataset):
-    def __init__(self, x_set, y_set):
-        super(Dataset).__init__()
-        self.x_set = x_set
-        self.y_set = y_set
+def _to_tensor(array):
+    # Paths to .npy caches written by preprocessing() are memory-mapped before being copied into one tensor
+    array = np.load(array, mmap_mode='r') if isinstance(array, str) else array
+    return torch.from_numpy(np.ascontiguousarray(array, dtype=np.float32))
 
-    def __len__(self):
-        return len(self.x_set)
-    
-    def __getitem__(self, idx):
-        return self.x_set[idx], self.y_set[idx]
\ No newline at end of file
+def build_dataset(x_set, y_set):
+    return TensorDataset(_to_tensor(x_set), _to_tensor(y_set))
+
+def build_dataloader(dataset, batch_size, shuffle=True, num_workers=4):
+    # Sampling whole batches of indices makes TensorDataset gather each batch with one advanced-indexing copy
+    # instead of collating batch_size single samples
+    sampler = RandomSampler(dataset) if shuffle else SequentialSampler(dataset)
+    return DataLoader(
+        dataset,
+        batch_size=None,
+        sampler=BatchSampler(sampler, batch_size, drop_last=False),
+        num_workers=num_workers,
+        pin_memory=torch.cuda.is_available(),
+        persistent_workers=num_workers > 0,
+        prefetch_factor=4 if num_workers > 0 else None,
+    )